@@ -1,6 +1,28 @@
 import requests
 import re
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Retry connection errors and 429/5xx with jittered exponential backoff, honouring Retry-After
+RETRY_POLICY = Retry(
+    total=5,
+    backoff_factor=1,
+    # Up to 1 s of random extra delay so throttled requests don't retry in lockstep
+    backoff_jitter=1.0,
+    status_forcelist=(429, 500, 502, 503, 504),
+    respect_retry_after_header=True
+)
+
+# Shared session so repeated page fetches reuse pooled connections and cookies
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=RETRY_POLICY))
+
+# Chapter id inside the onclick="cview('...')" handler of each chapter link
+CVIEW_PATTERN = re.compile(r"cview\('([^']*)'")
+
+# (connect, read) seconds, so a stalled server can't hang the script indefinitely
+REQUEST_TIMEOUT = (5, 30)
 
 def read_content_8comic(book_id):
     """
@@ -8,17 +30,14 @@ def read_content_8comic(book_id):
     """
     url = f"https://www.8comic.com/html/{book_id}.html"
     
-    # Use a session to persist cookies
-    session = requests.Session()
-    
     try:
         # Fetch the book page to capture cookies (e.g., CKVP)
-        response = session.get(url)
+        response = session.get(url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.exceptions.RequestException:
         return {"name": None, "chapters": []}
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    soup = BeautifulSoup(response.content, 'lxml')
     
     # Extract book name
     meta_name = soup.find('meta', {'name': 'name'})
@@ -29,17 +48,17 @@ def read_content_8comic(book_id):
     chapters_div = soup.find('div', id='chapters')
     
     if chapters_div:
+        # Check if the CKVP cookie exists in the session
+        ckvp_cookie = session.cookies.get("CKVP")
         for a_tag in chapters_div.find_all('a', onclick=True):
             onclick_js = a_tag['onclick']
-            match = re.search(r"cview\('([^']*)'", onclick_js)
+            match = CVIEW_PATTERN.search(onclick_js)
             
             if match:
                 u_param = match.group(1).replace('.html', '')
                 book_part, _, ch_part = u_param.partition('-')
                 ch_part = ch_part or '1'  # Default to chapter 1
                 
-                # Check if the CKVP cookie exists in the session
-                ckvp_cookie = session.cookies.get("CKVP")
                 if ckvp_cookie:
                     # Use the authenticated URL path
                     chapter_url = f"https://www.8comic.com/view/{book_part}.html?ch={ch_part}"
@@ -58,12 +77,11 @@ def read_first_chapter(book_id):
     Returns:
         dict: Contains book name, first chapter name, and chapter content (HTML or text)
     """
-    session = requests.Session()
     base_url = f"https://www.8comic.com/html/{book_id}.html"
     
     try:
         # First request to get cookies and book details
-        response = session.get(base_url)
+        response = session.get(base_url, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         return {
@@ -73,7 +91,7 @@ def read_first_chapter(book_id):
             "error": f"Failed to fetch book page: {str(e)}"
         }
 
-    soup = BeautifulSoup(response.content, 'html.parser')
+    soup = BeautifulSoup(response.content, 'lxml')
     
     # Extract book name
     meta_name = soup.find('meta', {'name': 'name'})
@@ -87,7 +105,7 @@ def read_first_chapter(book_id):
         first_chapter_link = chapters_div.find('a', onclick=True)
         if first_chapter_link:
             # Extract parameters from onclick JavaScript
-            match = re.search(r"cview\('([^']*)'", first_chapter_link['onclick'])
+            match = CVIEW_PATTERN.search(first_chapter_link['onclick'])
             if match:
                 u_param = match.group(1).replace('.html', '')
                 book_part, _, ch_part = u_param.partition('-')
@@ -111,7 +129,7 @@ def read_first_chapter(book_id):
 
     try:
         # Second request to get chapter content with maintained cookies
-        chapter_response = session.get(first_chapter_url)
+        chapter_response = session.get(first_chapter_url, timeout=REQUEST_TIMEOUT)
         chapter_response.raise_for_status()
     except requests.exceptions.RequestException as e:
         return {
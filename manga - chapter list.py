@@ -2,10 +2,12 @@ import argparse
 import asyncio
 import logging
 import os
-from urllib.parse import urlparse, parse_qs, urljoin
+import re
+from functools import lru_cache
+from urllib.parse import urlparse, urljoin
 
 import aiohttp
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 # Configure logging
 logging.basicConfig(
@@ -20,8 +22,39 @@ HEADERS = {
                   'Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# Bounds in-flight page requests (not whole chapter walks)
 CONCURRENCY_LIMIT = 5  # Adjust based on server tolerance
 semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
+# No cap on whole transfers, but a stalled connect or read fails quickly
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+
+# Build trees only for the navigation block get_next_part reads (pattern also matches multi-class attributes)
+NEXT_CHAPTER_STRAINER = SoupStrainer('div', class_=re.compile(r'(?:^|\s)next_chapter(?:\s|$)'))
+# The content page parse only needs the title heading and the chapter links
+CONTENT_INFO_STRAINER = SoupStrainer(['h1', 'a'])
+# Navigation link text meaning "next page/chapter" (matched against lower-cased text)
+NEXT_LINK_PATTERN = re.compile(r'下一[頁章页]|next')
+# chapter_slot value in a chapter link's query string, without building a parse_qs dict
+CHAPTER_SLOT_PATTERN = re.compile(r'[?&]chapter_slot=([^&#]+)')
+
+
+def create_connector():
+    """Create a pooled connector so page requests reuse TCP/TLS connections."""
+    try:
+        # aiodns resolves asynchronously instead of blocking getaddrinfo in a thread
+        resolver = aiohttp.AsyncResolver()
+    except RuntimeError:
+        resolver = None  # aiodns not installed; use the default threaded resolver
+
+    return aiohttp.TCPConnector(
+        resolver=resolver,
+        limit=50,
+        # Only page requests go through here, and at most CONCURRENCY_LIMIT at a time
+        limit_per_host=CONCURRENCY_LIMIT,
+        keepalive_timeout=30,
+        ttl_dns_cache=600,
+        enable_cleanup_closed=True
+    )
 
 
 async def get_content_info(session, book_id):
@@ -37,7 +70,7 @@ async def get_content_info(session, book_id):
         logging.error(f"Failed to fetch content page: {e}")
         raise
 
-    soup = BeautifulSoup(text, 'html.parser')
+    soup = BeautifulSoup(text, 'lxml', parse_only=CONTENT_INFO_STRAINER)
 
     title_tag = soup.find('h1', class_='comics-detail__title')
     if not title_tag:
@@ -45,13 +78,12 @@ async def get_content_info(session, book_id):
     manga_title = title_tag.get_text(strip=True)
 
     chapters = []
-    for item in soup.find_all('a', class_='comics-chapters__item'):
-        href = item.get('href', '')
-        parsed = urlparse(href)
-        params = parse_qs(parsed.query)
-        slot = params.get('chapter_slot', [None])[0]
+    for item in soup.find_all('a', class_='comics-chapters__item', href=True):
+        match = CHAPTER_SLOT_PATTERN.search(item['href'])
+        slot = match.group(1) if match else None
 
-        title = item.find('span').get_text(strip=True) if item.find('span') else ''
+        span = item.find('span')
+        title = span.get_text(strip=True) if span else ''
 
         if slot and title:
             chapters.append({
@@ -71,6 +103,7 @@ def create_output_dir(manga_title, book_id):
     return dir_name
 
 
+@lru_cache(maxsize=4096)
 def extract_url_slot(url):
     """Extract chapter slot from chapter URL."""
     try:
@@ -79,11 +112,12 @@ def extract_url_slot(url):
         base = filename.split('.')[0]
         parts = base.split('_')
         return parts[1] if len(parts) > 1 else None
-    except Exception as e:
-        logging.error(f"Error parsing URL slot: {e}")
+    except (IndexError, ValueError) as e:
+        logging.error(f"Error parsing URL slot from {url}: {e}")
         return None
 
 
+@lru_cache(maxsize=4096)
 def extract_part_number(url):
     """Extract part number from URL."""
     try:
@@ -102,14 +136,14 @@ async def get_next_part(session, current_url):
     logging.debug(f"Analyzing navigation at: {current_url}")
     
     try:
-        async with session.get(current_url) as response:
+        async with semaphore, session.get(current_url) as response:
             response.raise_for_status()
             text = await response.text()
-    except aiohttp.ClientError as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logging.error(f"Request failed: {e}")
         return None
 
-    soup = BeautifulSoup(text, 'html.parser')
+    soup = BeautifulSoup(text, 'lxml', parse_only=NEXT_CHAPTER_STRAINER)
     nav_divs = soup.find_all('div', class_='next_chapter')
 
     candidates = []
@@ -127,9 +161,7 @@ async def get_next_part(session, current_url):
     current_part = extract_part_number(current_url)
     for candidate in candidates:
         candidate_part = extract_part_number(candidate['url'])
-        if candidate_part == current_part + 1:
-            return candidate['url']
-        if any(keyword in candidate['text'] for keyword in ['下一頁', '下一章', '下一页', 'next']):
+        if (current_part is not None and candidate_part == current_part + 1) or NEXT_LINK_PATTERN.search(candidate['text']):
             return candidate['url']
 
     return None
@@ -137,35 +169,35 @@ async def get_next_part(session, current_url):
 
 async def process_chapter(session, book_id, chapter_slot, chapter_title):
     """Process a chapter asynchronously with concurrency control."""
-    async with semaphore:
-        base_url = f"https://www.twmanga.com/comic/chapter/{book_id}/0_{chapter_slot}"
-        parts = []
-        current_url = f"{base_url}.html"
-        expected_slot = chapter_slot
+    base_url = f"https://www.twmanga.com/comic/chapter/{book_id}/0_{chapter_slot}"
+    parts = []
+    current_url = f"{base_url}.html"
+    current_part = extract_part_number(current_url)
+    expected_slot = chapter_slot
 
-        logging.info(f"Starting chapter {chapter_slot} - {chapter_title}")
+    logging.info(f"Starting chapter {chapter_slot} - {chapter_title}")
 
-        while True:
-            current_slot = extract_url_slot(current_url)
-            if current_slot != expected_slot:
-                break
+    while True:
+        current_slot = extract_url_slot(current_url)
+        if current_slot != expected_slot:
+            break
 
-            parts.append(current_url)
-            logging.info(f"Chapter {chapter_slot} part {len(parts)} added")
+        parts.append(current_url)
+        logging.info(f"Chapter {chapter_slot} part {len(parts)} added")
 
-            next_url = await get_next_part(session, current_url)
-            if not next_url:
-                break
+        next_url = await get_next_part(session, current_url)
+        if not next_url:
+            break
 
-            next_slot = extract_url_slot(next_url)
-            next_part = extract_part_number(next_url)
-            if next_slot != expected_slot or next_part != extract_part_number(current_url) + 1:
-                break
+        next_slot = extract_url_slot(next_url)
+        next_part = extract_part_number(next_url)
+        if next_slot != expected_slot or (current_part is not None and next_part != current_part + 1):
+            break
 
-            current_url = next_url
+        current_url, current_part = next_url, next_part
 
-        logging.info(f"Completed chapter {chapter_slot} with {len(parts)} parts")
-        return parts
+    logging.info(f"Completed chapter {chapter_slot} with {len(parts)} parts")
+    return parts
 
 
 async def main():
@@ -179,7 +211,7 @@ async def main():
         logging.getLogger().setLevel(logging.DEBUG)
         logging.info("Debug logging enabled")
 
-    async with aiohttp.ClientSession(headers=HEADERS) as session:
+    async with aiohttp.ClientSession(headers=HEADERS, connector=create_connector(), timeout=REQUEST_TIMEOUT) as session:
         try:
             title, chapters = await get_content_info(session, args.book_id)
             output_dir = create_output_dir(title, args.book_id)
@@ -189,13 +221,14 @@ async def main():
             tasks = [process_chapter(session, args.book_id, ch['slot'], ch['title']) for ch in chapters]
             all_parts = await asyncio.gather(*tasks)
 
-            # Write results in original order
+            # Write results in original order, built in memory and written once
+            lines = []
+            for idx, (chapter, parts) in enumerate(zip(chapters, all_parts), 1):
+                lines.append(f"Chapter {idx}: {chapter['title']}\n")
+                lines.extend(f"  {part}\n" for part in parts)
+                lines.append("\n")
             with open(log_path, 'w', encoding='utf-8') as f:
-                for idx, (chapter, parts) in enumerate(zip(chapters, all_parts), 1):
-                    f.write(f"Chapter {idx}: {chapter['title']}\n")
-                    for part in parts:
-                        f.write(f"  {part}\n")
-                    f.write("\n")
+                f.write(''.join(lines))
 
             logging.info(f"Processing complete. Results saved to {log_path}")
 
@@ -205,4 +238,9 @@ async def main():
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())  # uvloop is optional (and unavailable on Windows)
+    else:
+        uvloop.run(main())
\ No newline at end of file
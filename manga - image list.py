@@ -2,10 +2,12 @@ import argparse
 import asyncio
 import logging
 import os
-from urllib.parse import urlparse, parse_qs, urljoin
+import re
+from functools import lru_cache
+from urllib.parse import urlparse, urljoin
 
 import aiohttp
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
 # Configure logging
 logging.basicConfig(
@@ -20,8 +22,41 @@ HEADERS = {
                   'Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# Bounds in-flight page requests (not whole chapter walks)
 CONCURRENCY_LIMIT = 5
 semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
+# No cap on whole transfers, but a stalled connect or read fails quickly
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+
+# A part page is parsed once, keeping only the image list and the navigation block
+# (the pattern also matches multi-class attributes)
+PART_PAGE_STRAINER = SoupStrainer(
+    ['ul', 'div'], class_=re.compile(r'(?:^|\s)(?:comic-contain|next_chapter)(?:\s|$)'))
+# The content page parse only needs the title heading and the chapter links
+CONTENT_INFO_STRAINER = SoupStrainer(['h1', 'a'])
+# Navigation link text meaning "next page/chapter" (matched against lower-cased text)
+NEXT_LINK_PATTERN = re.compile(r'下一[頁章页]|next')
+# chapter_slot value in a chapter link's query string, without building a parse_qs dict
+CHAPTER_SLOT_PATTERN = re.compile(r'[?&]chapter_slot=([^&#]+)')
+
+
+def create_connector():
+    """Create a pooled connector so page requests reuse TCP/TLS connections."""
+    try:
+        # aiodns resolves asynchronously instead of blocking getaddrinfo in a thread
+        resolver = aiohttp.AsyncResolver()
+    except RuntimeError:
+        resolver = None  # aiodns not installed; use the default threaded resolver
+
+    return aiohttp.TCPConnector(
+        resolver=resolver,
+        limit=50,
+        # Only page requests go through here, and at most CONCURRENCY_LIMIT at a time
+        limit_per_host=CONCURRENCY_LIMIT,
+        keepalive_timeout=30,
+        ttl_dns_cache=600,
+        enable_cleanup_closed=True
+    )
 
 
 async def get_content_info(session, book_id):
@@ -37,7 +72,7 @@ async def get_content_info(session, book_id):
         logging.error(f"Failed to fetch content page: {e}")
         raise
 
-    soup = BeautifulSoup(text, 'html.parser')
+    soup = BeautifulSoup(text, 'lxml', parse_only=CONTENT_INFO_STRAINER)
 
     title_tag = soup.find('h1', class_='comics-detail__title')
     if not title_tag:
@@ -45,13 +80,12 @@ async def get_content_info(session, book_id):
     manga_title = title_tag.get_text(strip=True)
 
     chapters = []
-    for item in soup.find_all('a', class_='comics-chapters__item'):
-        href = item.get('href', '')
-        parsed = urlparse(href)
-        params = parse_qs(parsed.query)
-        slot = params.get('chapter_slot', [None])[0]
+    for item in soup.find_all('a', class_='comics-chapters__item', href=True):
+        match = CHAPTER_SLOT_PATTERN.search(item['href'])
+        slot = match.group(1) if match else None
 
-        title = item.find('span').get_text(strip=True) if item.find('span') else ''
+        span = item.find('span')
+        title = span.get_text(strip=True) if span else ''
 
         if slot and title:
             chapters.append({
@@ -71,6 +105,7 @@ def create_output_dir(manga_title, book_id):
     return dir_name
 
 
+@lru_cache(maxsize=4096)
 def extract_url_slot(url):
     """Extract chapter slot from chapter URL."""
     try:
@@ -79,11 +114,12 @@ def extract_url_slot(url):
         base = filename.split('.')[0]
         parts = base.split('_')
         return parts[1] if len(parts) > 1 else None
-    except Exception as e:
-        logging.error(f"Error parsing URL slot: {e}")
+    except (IndexError, ValueError) as e:
+        logging.error(f"Error parsing URL slot from {url}: {e}")
         return None
 
 
+@lru_cache(maxsize=4096)
 def extract_part_number(url):
     """Extract part number from URL."""
     try:
@@ -97,19 +133,9 @@ def extract_part_number(url):
         return None
 
 
-async def get_next_part(session, current_url):
-    """Asynchronously find next part URL."""
+def find_next_part(soup, current_url):
+    """Find the next part URL in an already parsed part page."""
     logging.debug(f"Analyzing navigation at: {current_url}")
-    
-    try:
-        async with session.get(current_url) as response:
-            response.raise_for_status()
-            text = await response.text()
-    except aiohttp.ClientError as e:
-        logging.error(f"Request failed: {e}")
-        return None
-
-    soup = BeautifulSoup(text, 'html.parser')
     nav_divs = soup.find_all('div', class_='next_chapter')
 
     candidates = []
@@ -127,9 +153,7 @@ async def get_next_part(session, current_url):
     current_part = extract_part_number(current_url)
     for candidate in candidates:
         candidate_part = extract_part_number(candidate['url'])
-        if candidate_part == current_part + 1:
-            return candidate['url']
-        if any(keyword in candidate['text'] for keyword in ['下一頁', '下一章', '下一页', 'next']):
+        if (current_part is not None and candidate_part == current_part + 1) or NEXT_LINK_PATTERN.search(candidate['text']):
             return candidate['url']
 
     return None
@@ -137,71 +161,64 @@ async def get_next_part(session, current_url):
 
 async def process_chapter(session, book_id, chapter_slot, chapter_title):
     """Process a chapter asynchronously with concurrency control."""
-    async with semaphore:
-        base_url = f"https://www.twmanga.com/comic/chapter/{book_id}/0_{chapter_slot}"
-        image_urls = []
-        seen_urls = set()
-        parts_info = []
-        current_url = f"{base_url}.html"
-        expected_slot = chapter_slot
-
-        logging.info(f"Starting chapter {chapter_slot} - {chapter_title}")
-
-        while True:
-            current_slot = extract_url_slot(current_url)
-            if current_slot != expected_slot:
-                break
-
-            logging.info(f"Processing part: {current_url}")
-            try:
-                async with session.get(current_url) as response:
-                    response.raise_for_status()
-                    text = await response.text()
-            except aiohttp.ClientError as e:
-                logging.error(f"Failed to fetch part {current_url}: {e}")
-                break
-
-            soup = BeautifulSoup(text, 'html.parser')
-            comic_contain = soup.find('ul', class_='comic-contain')
-            if not comic_contain:
-                logging.error(f"No comic-contain found in {current_url}")
-                break
-
-            images = comic_contain.find_all('img')
-            part_images_count = 0
-            for img in images:
-                src = img.get('data-src') or img.get('src')
-                if not src:
-                    logging.warning("Image tag without src or data-src")
-                    continue
-                
-                img_url = urljoin(current_url, src)
-                
-                if img_url not in seen_urls:
-                    seen_urls.add(img_url)
-                    image_urls.append(img_url)
-                    part_images_count += 1
-
-            part_number = extract_part_number(current_url)
-            parts_info.append({
-                'part_number': part_number if part_number is not None else 'N/A',
-                'image_count': part_images_count
-            })
+    base_url = f"https://www.twmanga.com/comic/chapter/{book_id}/0_{chapter_slot}"
+    # Insertion-ordered dict: one structure for dedup and page order
+    image_urls = {}
+    parts_info = []
+    current_url = f"{base_url}.html"
+    current_part = extract_part_number(current_url)
+    expected_slot = chapter_slot
+
+    logging.info(f"Starting chapter {chapter_slot} - {chapter_title}")
+
+    while True:
+        current_slot = extract_url_slot(current_url)
+        if current_slot != expected_slot:
+            break
+
+        logging.info(f"Processing part: {current_url}")
+        try:
+            async with semaphore, session.get(current_url) as response:
+                response.raise_for_status()
+                text = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f"Failed to fetch part {current_url}: {e}")
+            break
 
-            next_url = await get_next_part(session, current_url)
-            if not next_url:
-                break
+        soup = BeautifulSoup(text, 'lxml', parse_only=PART_PAGE_STRAINER)
+        comic_contain = soup.find('ul', class_='comic-contain')
+        if not comic_contain:
+            logging.error(f"No comic-contain found in {current_url}")
+            break
 
-            next_slot = extract_url_slot(next_url)
-            next_part = extract_part_number(next_url)
-            current_part = extract_part_number(current_url)
-            if next_slot != expected_slot or (current_part is not None and next_part != current_part + 1):
-                break
+        srcs = [img.get('data-src') or img.get('src') for img in comic_contain.find_all('img')]
+        missing = sum(1 for src in srcs if not src)
+        if missing:
+            logging.warning(f"{missing} image tags without src or data-src in {current_url}")
 
-            current_url = next_url
+        # update() keeps the first position of URLs already seen on earlier parts
+        known = len(image_urls)
+        image_urls.update(dict.fromkeys(urljoin(current_url, src) for src in srcs if src))
+        part_images_count = len(image_urls) - known
 
-        logging.info(f"Completed chapter {chapter_slot} with {len(image_urls)} unique images")
-        return image_urls, parts_info
+        parts_info.append({
+            'part_number': current_part if current_part is not None else 'N/A',
+            'image_count': part_images_count
+        })
+
+        next_url = find_next_part(soup, current_url)
+        if not next_url:
+            break
+
+        next_slot = extract_url_slot(next_url)
+        next_part = extract_part_number(next_url)
+        if next_slot != expected_slot or (current_part is not None and next_part != current_part + 1):
+            break
+
+        current_url, current_part = next_url, next_part
+
+    logging.info(f"Completed chapter {chapter_slot} with {len(image_urls)} unique images")
+    return list(image_urls), parts_info
 
 
 async def main():
@@ -215,7 +232,7 @@ async def main():
         logging.getLogger().setLevel(logging.DEBUG)
         logging.info("Debug logging enabled")
 
-    async with aiohttp.ClientSession(headers=HEADERS) as session:
+    async with aiohttp.ClientSession(headers=HEADERS, connector=create_connector(), timeout=REQUEST_TIMEOUT) as session:
         try:
             title, chapters = await get_content_info(session, args.book_id)
             output_dir = create_output_dir(title, args.book_id)
@@ -227,31 +244,35 @@ async def main():
             image_urls_list = [result[0] for result in results]
             parts_info_list = [result[1] for result in results]
 
-            # Write image URLs log
+            # Build each report in memory and write it with a single call
+            lines = []
+            for idx, (chapter, images) in enumerate(zip(chapters, image_urls_list), 1):
+                lines.append(f"Chapter {idx}: {chapter['title']}\n")
+                lines.extend(f"{img_url}\n" for img_url in images)
+                lines.append("\n")
             with open(log_path, 'w', encoding='utf-8') as f:
-                for idx, (chapter, images) in enumerate(zip(chapters, image_urls_list), 1):
-                    f.write(f"Chapter {idx}: {chapter['title']}\n")
-                    for img_url in images:
-                        f.write(f"{img_url}\n")
-                    f.write("\n")
+                f.write(''.join(lines))
 
             # Write statistics
+            lines = [
+                "Statistics of Images per Chapter/Part\n",
+                "====================================\n\n",
+            ]
+            total_images = 0
+            for idx, (chapter, parts_info) in enumerate(zip(chapters, parts_info_list), 1):
+                chapter_title = chapter['title']
+                lines.append(f"Chapter {idx}: {chapter_title}\n")
+                chapter_total = 0
+                for part in parts_info:
+                    part_num = part['part_number']
+                    img_count = part['image_count']
+                    chapter_total += img_count
+                    lines.append(f"  Part {part_num}: {img_count} images\n")
+                lines.append(f"  Total: {chapter_total} images\n\n")
+                total_images += chapter_total
+            lines.append(f"Grand Total: {total_images} images across all chapters\n")
             with open(stat_path, 'w', encoding='utf-8') as f:
-                f.write("Statistics of Images per Chapter/Part\n")
-                f.write("====================================\n\n")
-                total_images = 0
-                for idx, (chapter, parts_info) in enumerate(zip(chapters, parts_info_list), 1):
-                    chapter_title = chapter['title']
-                    f.write(f"Chapter {idx}: {chapter_title}\n")
-                    chapter_total = 0
-                    for part in parts_info:
-                        part_num = part['part_number']
-                        img_count = part['image_count']
-                        chapter_total += img_count
-                        f.write(f"  Part {part_num}: {img_count} images\n")
-                    f.write(f"  Total: {chapter_total} images\n\n")
-                    total_images += chapter_total
-                f.write(f"Grand Total: {total_images} images across all chapters\n")
+                f.write(''.join(lines))
 
             logging.info(f"Processing complete. Results saved to {log_path} and {stat_path}")
 
@@ -261,4 +282,9 @@ async def main():
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())  # uvloop is optional (and unavailable on Windows)
+    else:
+        uvloop.run(main())
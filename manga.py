@@ -1,22 +1,30 @@
 import argparse
 import asyncio
 import datetime
+import hashlib
+import html
 import logging
 import os
+import queue
+import random
+import re
 import shutil
+import struct
 import sys
 import tempfile
-from functools import partial
-from urllib.parse import urlparse, parse_qs, urljoin
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import urlparse, urljoin
 
+import aiofiles
 import aiohttp
 import img2pdf
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from PIL import Image
 from concurrent.futures import ProcessPoolExecutor
-from tqdm import tqdm
-import tqdm.asyncio
+import tqdm
 import unicodedata
+from dataclasses import dataclass
 from tqdm.contrib.logging import logging_redirect_tqdm
 
 
@@ -33,11 +41,181 @@ HEADERS = {
                   'Chrome/91.0.4472.124 Safari/537.36'
 }
 
+# Bounds in-flight page requests (not whole chapters), released between retries
 CONCURRENCY_LIMIT = 10
 semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
+# No cap on whole transfers, but a stalled connect or read fails (and is retried) quickly
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
 IMAGE_CONCURRENCY_LIMIT = 20
 image_semaphore = asyncio.Semaphore(IMAGE_CONCURRENCY_LIMIT)
 PDF_PROCESSOR_WORKERS = 4
+CHAPTER_DOWNLOAD_LIMIT = 4
+chapter_download_semaphore = asyncio.Semaphore(CHAPTER_DOWNLOAD_LIMIT)
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+JPEG_HEADER_BYTES = 64 * 1024
+# SOF markers carrying frame dimensions (excludes DHT 0xC4, JPG 0xC8, DAC 0xCC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Huffman-coded baseline/extended/progressive frames: the only ones PDF's DCTDecode can embed
+JPEG_DCT_SOF_MARKERS = {0xC0, 0xC1, 0xC2}
+JPEG_COLORSPACES = {1: '/DeviceGray', 3: '/DeviceRGB'}
+IMAGE_SIGNATURES = ((b'\xff\xd8\xff', '.jpg'), (b'\x89PNG\r\n\x1a\n', '.png'), (b'GIF8', '.gif'))
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 10.0
+# Server-requested Retry-After waits are honoured up to this long, and don't use up
+# MAX_ATTEMPTS; MAX_THROTTLED_WAITS bounds how many of them one request will sit through
+RETRY_AFTER_MAX_DELAY = 120.0
+MAX_THROTTLED_WAITS = 3
+
+# A part page is parsed once, keeping only the image list and the navigation block
+# (the pattern also matches multi-class attributes)
+PART_PAGE_STRAINER = SoupStrainer(
+    ['ul', 'div'], class_=re.compile(r'(?:^|\s)(?:comic-contain|next_chapter)(?:\s|$)'))
+# The content page parse only needs the title heading and the chapter links
+CONTENT_INFO_STRAINER = SoupStrainer(['h1', 'a'])
+# Navigation link text meaning "next page/chapter" (matched against lower-cased text)
+NEXT_LINK_PATTERN = re.compile(r'下一[頁章页]|next')
+# chapter_slot value in a chapter link's query string, without building a parse_qs dict
+CHAPTER_SLOT_PATTERN = re.compile(r'[?&]chapter_slot=([^&#]+)')
+
+class FilenameCharMap(dict):
+    """str.translate table mapping characters that are not alphanumeric or in keep to '_'."""
+
+    def __init__(self, keep):
+        super().__init__()
+        self.keep = keep
+
+    def __missing__(self, codepoint):
+        # Classify each distinct character once; translate() hits the dict afterwards
+        char = chr(codepoint)
+        self[codepoint] = codepoint if char.isalnum() or char in self.keep else '_'
+        return self[codepoint]
+
+FILENAME_CHARS = FilenameCharMap('_-')
+DIRNAME_CHARS = FilenameCharMap(' _')
+
+@dataclass(slots=True, frozen=True)
+class Chapter:
+    """A chapter entry from the comic content page."""
+    slot: str
+    title: str
+
+def create_connector():
+    """Create a pooled connector so pages and images reuse TCP/TLS connections."""
+    try:
+        # aiodns resolves asynchronously instead of blocking getaddrinfo in a thread
+        resolver = aiohttp.AsyncResolver()
+    except RuntimeError:
+        resolver = None  # aiodns not installed; use the default threaded resolver
+
+    return aiohttp.TCPConnector(
+        resolver=resolver,
+        limit=50,
+        # Enough per-host slots for every concurrent image download to keep its own socket
+        limit_per_host=IMAGE_CONCURRENCY_LIMIT,
+        keepalive_timeout=30,
+        ttl_dns_cache=600,
+        enable_cleanup_closed=True
+    )
+
+def is_retryable(error):
+    """Transient failures worth another attempt: connection drops, truncated bodies, timeouts, 429 and 5xx."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 429 or error.status >= 500
+    # Not every ClientError: InvalidURL and the like fail the same way every time
+    return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+def retry_after(error):
+    """Seconds the server asked to wait via a numeric Retry-After, or None."""
+    headers = getattr(error, 'headers', None) or {}
+    value = headers.get('Retry-After', '')
+    return min(float(value), RETRY_AFTER_MAX_DELAY) if value.isdigit() else None
+
+def retry_delay(attempt):
+    """Seconds of jittered exponential backoff before the next attempt."""
+    # Jitter keeps concurrent downloads that failed together from retrying in lockstep
+    return min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY) * random.uniform(0.5, 1.0)
+
+async def with_retries(operation, *args):
+    """Await operation(*args), retrying transient HTTP failures with exponential backoff."""
+    attempt = throttled = 0
+    while True:
+        try:
+            return await operation(*args)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not is_retryable(e):
+                raise
+            wait = retry_after(e)
+            if wait is not None and throttled < MAX_THROTTLED_WAITS:
+                throttled += 1
+                logging.warning(f"Throttled: {e}; retrying in {wait:.0f}s as asked by Retry-After")
+                await asyncio.sleep(wait)
+                continue
+            attempt += 1
+            if attempt == MAX_ATTEMPTS:
+                raise
+            delay = retry_delay(attempt - 1)
+            logging.warning(f"Attempt {attempt}/{MAX_ATTEMPTS} failed: {e}; retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def fetch_page(session, url, cache_dir=None):
+    """Fetch page text with retries, revalidating a cached copy by ETag when cache_dir is set."""
+    return await with_retries(fetch_page_once, session, url, cache_dir)
+
+async def fetch_page_once(session, url, cache_dir=None):
+    """Fetch page text, revalidating a cached copy by ETag when cache_dir is set."""
+    if cache_dir is None:
+        async with semaphore, session.get(url) as response:
+            response.raise_for_status()
+            return await response.text()
+
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    body_path = os.path.join(cache_dir, f"{key}.html")
+    etag_path = os.path.join(cache_dir, f"{key}.etag")
+
+    headers = {}
+    if os.path.exists(body_path) and os.path.exists(etag_path):
+        async with aiofiles.open(etag_path, 'r', encoding='utf-8') as f:
+            headers['If-None-Match'] = await f.read()
+
+    async with semaphore, session.get(url, headers=headers) as response:
+        if response.status == 304:
+            logging.debug(f"Not modified, using cached page: {url}")
+            async with aiofiles.open(body_path, 'r', encoding='utf-8') as f:
+                return await f.read()
+        response.raise_for_status()
+        text = await response.text()
+        etag = response.headers.get('ETag')
+
+    if etag:
+        # Body first, so an ETag is never stored without the page it validates
+        try:
+            async with aiofiles.open(body_path, 'w', encoding='utf-8') as f:
+                await f.write(text)
+            async with aiofiles.open(etag_path, 'w', encoding='utf-8') as f:
+                await f.write(etag)
+        except OSError as e:
+            # The cache is an optimisation; the page itself was fetched fine. Drop any
+            # older ETag so it can't vouch for a partially written body
+            logging.warning(f"Failed to cache {url}: {e}")
+            try:
+                os.remove(etag_path)
+            except OSError:
+                pass
+    return text
+
+async def prewarm_connection(session, url):
+    """Open a pooled connection (DNS + TLS) to url's host ahead of a download burst."""
+    parsed = urlparse(url)
+    try:
+        async with session.head(
+            f"{parsed.scheme}://{parsed.netloc}/",
+            allow_redirects=False,
+            timeout=aiohttp.ClientTimeout(total=5)
+        ):
+            pass
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.debug(f"Connection pre-warm failed for {parsed.netloc}: {e}")
 
 async def get_content_info(session, book_id):
     """Fetch and parse comic content page information asynchronously."""
@@ -45,14 +223,12 @@ async def get_content_info(session, book_id):
     logging.info(f"Fetching content page: {url}")
     
     try:
-        async with session.get(url) as response:
-            response.raise_for_status()
-            text = await response.text()
-    except aiohttp.ClientError as e:
+        text = await fetch_page(session, url)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         logging.error(f"Failed to fetch content page: {e}")
         raise
 
-    soup = BeautifulSoup(text, 'html.parser')
+    soup = BeautifulSoup(text, 'lxml', parse_only=CONTENT_INFO_STRAINER)
 
     title_tag = soup.find('h1', class_='comics-detail__title')
     if not title_tag:
@@ -60,30 +236,26 @@ async def get_content_info(session, book_id):
     manga_title = title_tag.get_text(strip=True)
 
     chapters = []
-    for item in soup.find_all('a', class_='comics-chapters__item'):
-        href = item.get('href', '')
-        parsed = urlparse(href)
-        params = parse_qs(parsed.query)
-        slot = params.get('chapter_slot', [None])[0]
+    for item in soup.find_all('a', class_='comics-chapters__item', href=True):
+        match = CHAPTER_SLOT_PATTERN.search(item['href'])
+        slot = match.group(1) if match else None
 
-        title = item.find('span').get_text(strip=True) if item.find('span') else ''
+        span = item.find('span')
+        title = span.get_text(strip=True) if span else ''
 
         if slot and title:
-            chapters.append({
-                'slot': slot,
-                'title': title,
-                'parts': []
-            })
+            chapters.append(Chapter(slot=slot, title=title))
 
     return manga_title, chapters
 
 def create_output_dir(manga_title, book_id):
     """Create output directory with sanitized name."""
-    sanitized = ''.join(c if c.isalnum() or c in (' ', '_') else '_' for c in manga_title)
+    sanitized = manga_title.translate(DIRNAME_CHARS)
     dir_name = f"{sanitized}_{book_id}"
     os.makedirs(dir_name, exist_ok=True)
     return dir_name
 
+@lru_cache(maxsize=4096)
 def extract_url_slot(url):
     """Extract chapter slot from chapter URL."""
     try:
@@ -92,10 +264,11 @@ def extract_url_slot(url):
         base = filename.split('.')[0]
         parts = base.split('_')
         return parts[1] if len(parts) > 1 else None
-    except Exception as e:
-        logging.error(f"Error parsing URL slot: {e}")
+    except (IndexError, ValueError) as e:
+        logging.error(f"Error parsing URL slot from {url}: {e}")
         return None
 
+@lru_cache(maxsize=4096)
 def extract_part_number(url):
     """Extract part number from URL."""
     try:
@@ -108,19 +281,9 @@ def extract_part_number(url):
         logging.error(f"Error extracting part number from {url}: {e}")
         return None
 
-async def get_next_part(session, current_url):
-    """Asynchronously find next part URL."""
+def find_next_part(soup, current_url):
+    """Find the next part URL in an already parsed part page."""
     logging.debug(f"Analyzing navigation at: {current_url}")
-    
-    try:
-        async with session.get(current_url) as response:
-            response.raise_for_status()
-            text = await response.text()
-    except aiohttp.ClientError as e:
-        logging.error(f"Request failed: {e}")
-        return None
-
-    soup = BeautifulSoup(text, 'html.parser')
     nav_divs = soup.find_all('div', class_='next_chapter')
 
     candidates = []
@@ -138,24 +301,31 @@ async def get_next_part(session, current_url):
     current_part = extract_part_number(current_url)
     for candidate in candidates:
         candidate_part = extract_part_number(candidate['url'])
-        if candidate_part == current_part + 1:
-            return candidate['url']
-        if any(keyword in candidate['text'] for keyword in ['下一頁', '下一章', '下一页', 'next']):
+        if (current_part is not None and candidate_part == current_part + 1) or NEXT_LINK_PATTERN.search(candidate['text']):
             return candidate['url']
 
     return None
 
-async def process_chapter(session, book_id, chapter_slot, chapter_title):
+def discard_task(task):
+    """Cancel a task whose result is no longer needed, retrieving any exception it raised."""
+    task.cancel()
+    if task.done() and not task.cancelled():
+        task.exception()
+
+async def process_chapter(session, book_id, chapter_slot, chapter_title, cache_dir=None):
     """Process a chapter to extract image URLs asynchronously."""
-    async with semaphore:
-        base_url = f"https://www.twmanga.com/comic/chapter/{book_id}/0_{chapter_slot}"
-        image_urls = []
-        seen_urls = set()
-        current_url = f"{base_url}.html"
-        expected_slot = chapter_slot
+    base_url = f"https://www.twmanga.com/comic/chapter/{book_id}/0_{chapter_slot}"
+    # Insertion-ordered dict: one structure for dedup and page order
+    image_urls = {}
+    current_url = f"{base_url}.html"
+    current_part = extract_part_number(current_url)
+    expected_slot = chapter_slot
+    # Speculative fetch of the part URL expected to follow the current one
+    prefetch = prefetch_url = None
 
-        logging.info(f"Starting chapter {chapter_slot} - {chapter_title}")
+    logging.info(f"Starting chapter {chapter_slot} - {chapter_title}")
 
+    try:
         while True:
             current_slot = extract_url_slot(current_url)
             if current_slot != expected_slot:
@@ -163,154 +333,352 @@ async def process_chapter(session, book_id, chapter_slot, chapter_title):
 
             logging.info(f"Processing part: {current_url}")
             try:
-                async with session.get(current_url) as response:
-                    response.raise_for_status()
-                    text = await response.text()
-            except aiohttp.ClientError as e:
+                if prefetch and prefetch_url == current_url:
+                    text = await prefetch
+                else:
+                    text = await fetch_page(session, current_url, cache_dir)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 logging.error(f"Failed to fetch part {current_url}: {e}")
                 break
-
-            soup = BeautifulSoup(text, 'html.parser')
+            finally:
+                if prefetch:
+                    discard_task(prefetch)
+                    prefetch = None
+
+            # Parts are numbered sequentially, so fetch the likely next one while
+            # this part is parsed and its navigation links are checked
+            if current_part is not None:
+                prefetch_url = f"{base_url}_{current_part + 1}.html"
+                prefetch = asyncio.ensure_future(fetch_page(session, prefetch_url, cache_dir))
+
+            # The parse runs in a thread: done inline it would block the loop, and the
+            # prefetch would not start until the next await, after the parse
+            soup = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: BeautifulSoup(text, 'lxml', parse_only=PART_PAGE_STRAINER))
             comic_contain = soup.find('ul', class_='comic-contain')
             if not comic_contain:
                 logging.error(f"No comic-contain found in {current_url}")
                 break
 
-            images = comic_contain.find_all('img')
-            for img in images:
-                src = img.get('data-src') or img.get('src')
-                if not src:
-                    logging.warning("Image tag without src or data-src")
-                    continue
-                
-                img_url = urljoin(current_url, src)
-                
-                if img_url not in seen_urls:
-                    seen_urls.add(img_url)
-                    image_urls.append(img_url)
-                    logging.debug(f"Found new image URL: {img_url}")
-                else:
-                    logging.debug(f"Skipped duplicate image: {img_url}")
+            srcs = [img.get('data-src') or img.get('src') for img in comic_contain.find_all('img')]
+            missing = sum(1 for src in srcs if not src)
+            if missing:
+                logging.warning(f"{missing} image tags without src or data-src in {current_url}")
+
+            # update() keeps the first position of URLs already seen on earlier parts
+            known = len(image_urls)
+            image_urls.update(dict.fromkeys(urljoin(current_url, src) for src in srcs if src))
+            logging.debug(f"Found {len(image_urls) - known} new image URLs in {current_url}")
 
-            next_url = await get_next_part(session, current_url)
+            next_url = find_next_part(soup, current_url)
             if not next_url:
                 break
 
             next_slot = extract_url_slot(next_url)
             next_part = extract_part_number(next_url)
-            current_part = extract_part_number(current_url)
             if next_slot != expected_slot or (current_part is not None and next_part != current_part + 1):
                 break
 
-            current_url = next_url
+            current_url, current_part = next_url, next_part
+    finally:
+        if prefetch:
+            discard_task(prefetch)
+
+    logging.info(f"Completed chapter {chapter_slot} with {len(image_urls)} unique images")
+    return list(image_urls)
+
+def exif_overrides_layout(tiff, has_jfif_dpi):
+    """True if an Exif block sets an orientation or resolution a plain JPEG parse would miss."""
+    try:
+        order = {b'II': '<', b'MM': '>'}[tiff[:2]]
+        ifd = struct.unpack(order + 'I', tiff[4:8])[0]
+        count = struct.unpack(order + 'H', tiff[ifd:ifd + 2])[0]
+        for n in range(count):
+            entry = tiff[ifd + 2 + 12 * n:ifd + 14 + 12 * n]
+            tag = struct.unpack(order + 'H', entry[:2])[0]
+            # Pillow (and so img2pdf) rotates by Orientation and falls back to the
+            # Exif resolution for dpi only when JFIF doesn't give one
+            if tag == 0x0112 and struct.unpack(order + 'H', entry[8:10])[0] != 1:
+                return True
+            if tag in (0x011A, 0x011B) and not has_jfif_dpi:
+                return True
+        return False
+    except (KeyError, struct.error):
+        # Unreadable Exif: let Pillow make sense of it
+        return True
+
+def read_jpeg_info(data):
+    """Read (width, height, components, dpi, embeddable) from JPEG header bytes, or None.
+
+    embeddable is True for 8-bit DCT frames that can go into a PDF as-is.
+
+    None also covers JPEGs whose Exif data changes orientation or dpi; those
+    need Pillow/img2pdf to be laid out the same way.
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+
+    dpi = (96.0, 96.0)
+    has_jfif_dpi = False
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before the actual marker
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Standalone markers carry no length field
+            i += 2
+            continue
+
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if marker == 0xE0 and data[i + 4:i + 9] == b'JFIF\x00' and i + 16 <= len(data):
+            units = data[i + 11]
+            x_density, y_density = struct.unpack('>HH', data[i + 12:i + 16])
+            if x_density and y_density:
+                if units == 1:
+                    dpi = (float(x_density), float(y_density))
+                elif units == 2:
+                    dpi = (x_density * 2.54, y_density * 2.54)
+                has_jfif_dpi = units in (1, 2)
+        elif marker == 0xE1 and data[i + 4:i + 10] == b'Exif\x00\x00':
+            if exif_overrides_layout(data[i + 10:i + 2 + length], has_jfif_dpi):
+                return None
+        elif marker in JPEG_SOF_MARKERS:
+            if i + 10 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            embeddable = marker in JPEG_DCT_SOF_MARKERS and data[i + 4] == 8
+            return width, height, data[i + 9], dpi, embeddable
+        i += 2 + length
+
+    return None
+
+def read_image_size(filepath):
+    """Return (width, height, dpi_x, dpi_y), parsing JPEG headers without Pillow."""
+    with open(filepath, 'rb') as f:
+        info = read_jpeg_info(f.read(JPEG_HEADER_BYTES))
+    if info:
+        width, height, _, (dpi_x, dpi_y), _ = info
+        return width, height, dpi_x, dpi_y
 
-        logging.info(f"Completed chapter {chapter_slot} with {len(image_urls)} unique images")
-        return image_urls
+    with Image.open(filepath) as img:
+        dpi_x, dpi_y = img.info.get('dpi', (96.0, 96.0))
+        return img.width, img.height, dpi_x, dpi_y
 
-def validate_image_dimensions(filepath):
+def validate_image_dimensions(filepath, size=None):
     """Check if image dimensions in PDF points are within valid range."""
     try:
-        with Image.open(filepath) as img:
-            dpi_x, dpi_y = img.info.get('dpi', (96.0, 96.0))
-            dpi_x = float(dpi_x) if float(dpi_x) > 0 else 96.0
-            dpi_y = float(dpi_y) if float(dpi_y) > 0 else 96.0
-
-            width_pt = (img.width / dpi_x) * 72
-            height_pt = (img.height / dpi_y) * 72
-            logging.debug(
-                f"Image DPI: ({dpi_x:.1f}, {dpi_y:.1f}), "
-                f"Dimensions: {img.width}x{img.height}px, "
-                f"PDF Points: {width_pt:.1f}x{height_pt:.1f}"
+        width, height, dpi_x, dpi_y = size or read_image_size(filepath)
+        dpi_x = float(dpi_x) if float(dpi_x) > 0 else 96.0
+        dpi_y = float(dpi_y) if float(dpi_y) > 0 else 96.0
+
+        width_pt = (width / dpi_x) * 72
+        height_pt = (height / dpi_y) * 72
+        logging.debug(
+            f"Image DPI: ({dpi_x:.1f}, {dpi_y:.1f}), "
+            f"Dimensions: {width}x{height}px, "
+            f"PDF Points: {width_pt:.1f}x{height_pt:.1f}"
+        )
+        if 3 <= width_pt <= 14400 and 3 <= height_pt <= 14400:
+            return True
+        else:
+            logging.warning(
+                f"Invalid PDF size {width_pt:.1f}x{height_pt:.1f} pts "
+                f"for {filepath}. Skipping."
             )
-            if 3 <= width_pt <= 14400 and 3 <= height_pt <= 14400:
-                return True
-            else:
-                logging.warning(
-                    f"Invalid PDF size {width_pt:.1f}x{height_pt:.1f} pts "
-                    f"for {filepath}. Skipping."
-                )
-                return False
+            return False
     except Exception as e:
         logging.error(f"Image validation failed for {filepath}: {e}")
         return False
             
+async def stream_image(session, url, chapter_dir, idx):
+    """Stream an image to disk, returning (filepath, header bytes, last two bytes, SHA-1 digest)."""
+    async with session.get(url) as response:
+        response.raise_for_status()
+
+        # Name the file after its magic bytes; CDNs often send application/octet-stream
+        chunk = await response.content.read(DOWNLOAD_CHUNK_SIZE)
+        ext = next((ext for magic, ext in IMAGE_SIGNATURES if chunk.startswith(magic)), None)
+        if ext is None:
+            content_type = response.headers.get('Content-Type', '').lower()
+            if 'image/jpeg' in content_type:
+                ext = '.jpg'
+            elif 'image/png' in content_type:
+                ext = '.png'
+            elif 'image/gif' in content_type:
+                ext = '.gif'
+            else:
+                ext = '.bin'
+
+        filename = f"image_{idx:03d}{ext}"
+        filepath = os.path.join(chapter_dir, filename)
+        
+        # Stream to disk so only one chunk per download is held in memory,
+        # keeping the header and last bytes so validation needn't re-read the file
+        head = bytearray()
+        tail = b''
+        digest = hashlib.sha1()
+        async with aiofiles.open(filepath, 'wb') as f:
+            while chunk:
+                if len(head) < JPEG_HEADER_BYTES:
+                    head += chunk[:JPEG_HEADER_BYTES - len(head)]
+                tail = chunk[-2:] if len(chunk) >= 2 else (tail + chunk)[-2:]
+                digest.update(chunk)
+                await f.write(chunk)
+                chunk = await response.content.read(DOWNLOAD_CHUNK_SIZE)
+
+        return filepath, bytes(head), tail, digest.digest()
+
 async def async_download_image(session, url, chapter_dir, idx):
-    """Download and validate images asynchronously."""
+    """Download and validate an image, returning (idx, filepath or None, content digest)."""
     async with image_semaphore:
         try:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                content = await response.read()
-                
-                content_type = response.headers.get('Content-Type', '').lower()
-                if 'image/jpeg' in content_type:
-                    ext = '.jpg'
-                elif 'image/png' in content_type:
-                    ext = '.png'
-                elif 'image/gif' in content_type:
-                    ext = '.gif'
-                else:
-                    ext = '.bin'
-
-                filename = f"image_{idx:03d}{ext}"
-                filepath = os.path.join(chapter_dir, filename)
-                
-                with open(filepath, 'wb') as f:
-                    f.write(content)
-                
+            filepath, head, tail, digest = await with_retries(stream_image, session, url, chapter_dir, idx)
+
+            info = read_jpeg_info(head)
+            if info and tail == b'\xff\xd9':
+                # Complete JPEG: check the page size straight from the captured header
+                width, height, _, (dpi_x, dpi_y), _ = info
+                is_valid = validate_image_dimensions(filepath, (width, height, dpi_x, dpi_y))
+            else:
+                # File reads and Pillow decoding run in a thread, off the event loop
                 loop = asyncio.get_event_loop()
                 is_valid = await loop.run_in_executor(
-                    None, partial(validate_image_dimensions, filepath))
-                
-                if not is_valid:
-                    os.remove(filepath)
-                    return None
-                
-                return filepath
+                    None, lambda: validate_image_dimensions(filepath) and verify_image_integrity(filepath))
+            
+            if not is_valid:
+                os.remove(filepath)
+                return idx, None, None
+            
+            return idx, filepath, digest
         except Exception as e:
             logging.error(f"Image download failed: {url} - {e}")
-            return None
+            return idx, None, None
 
 def sanitize_filename(name):
     """Safely sanitize filenames with Unicode support."""
     name = unicodedata.normalize('NFKC', name)
-    return "".join([c if c.isalnum() or c in ('_', '-') else '_' for c in name]).strip('_')
+    return name.translate(FILENAME_CHARS).strip('_')
+
+def get_pdf_filename(manga_title, chapter_slot, chapter_title):
+    """Build the PDF filename used for a chapter."""
+    sanitized_manga_title = sanitize_filename(manga_title)
+    sanitized_chapter_title = sanitize_filename(chapter_title)
+    return f"Chapter_{chapter_slot}_{sanitized_manga_title}_{sanitized_chapter_title}.pdf"
 
-async def verify_image_integrity(image_path):
+def verify_image_integrity(image_path):
     """Ensure images are valid and readable."""
     try:
+        # Truncated downloads are the common failure: a complete JPEG has SOI and EOI
+        with open(image_path, 'rb') as f:
+            head = f.read(3)
+            f.seek(-2, os.SEEK_END)
+            tail = f.read(2)
+        if head == b'\xff\xd8\xff' and tail == b'\xff\xd9':
+            return True
+
         with Image.open(image_path) as img:
-            img.verify()
+            if head == b'\xff\xd8\xff':
+                # A JPEG without a trailing EOI: verify() checks nothing for JPEG, so decode
+                # it fully, which raises on a truncated stream
+                img.load()
+            else:
+                img.verify()
         return True
     except Exception as e:
         logging.error(f"Invalid image: {image_path} - {str(e)}")
         return False
 
-async def create_pdf_sync(image_paths, output_path):
-    """Synchronous PDF creation wrapper with detailed diagnostics."""
-    valid_images = []
+def jpegs_to_pdf(image_paths, output_path):
+    """Write JPEGs into a PDF as-is (DCTDecode), one page per image.
+
+    Returns False without touching output_path if any image is not an 8-bit
+    baseline/progressive grayscale/RGB JPEG, so the caller can fall back to img2pdf.
+    """
+    pages = []
     for img_path in image_paths:
-        try:
-            with Image.open(img_path) as img:
-                dpi_x, dpi_y = img.info.get('dpi', (96.0, 96.0))
-                dpi_x = dpi_x if dpi_x > 0 else 96.0
-                dpi_y = dpi_y if dpi_y > 0 else 96.0
-                width_pt = (img.width / dpi_x) * 72
-                height_pt = (img.height / dpi_y) * 72
-                if not (3 <= width_pt <= 14400 and 3 <= height_pt <= 14400):
-                    logging.warning(f"Skipping {img_path} due to invalid dimensions post-validation")
-                    continue
-            valid_images.append(img_path)
-        except Exception as e:
-            logging.error(f"Invalid image {img_path} detected pre-conversion: {e}")
-    
-    if not valid_images:
-        logging.error("No valid images remaining for PDF creation")
-        return False
+        with open(img_path, 'rb') as f:
+            info = read_jpeg_info(f.read(JPEG_HEADER_BYTES))
+        if info is None or info[2] not in JPEG_COLORSPACES or not info[4]:
+            return False
+        pages.append((img_path, info))
+
+    # Object 1 is the catalog, 2 the page tree, then image/content/page per image
+    page_ids = [5 + 3 * n for n in range(len(pages))]
+    offsets = {}
+
+    with open(output_path, 'wb') as out:
+        def write_object(obj_id, body, stream=None):
+            offsets[obj_id] = out.tell()
+            out.write(f"{obj_id} 0 obj\n".encode() + body)
+            if stream is not None:
+                out.write(b"\nstream\n" + stream + b"\nendstream")
+            out.write(b"\nendobj\n")
+
+        out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+        write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+
+        for page_id, (img_path, (width, height, components, (dpi_x, dpi_y), _)) in zip(page_ids, pages):
+            image_id, content_id = page_id - 2, page_id - 1
+            width_pt = width / (dpi_x if dpi_x > 0 else 96.0) * 72
+            height_pt = height / (dpi_y if dpi_y > 0 else 96.0) * 72
+
+            # Copy the JPEG into its stream in chunks rather than holding the whole file
+            offsets[image_id] = out.tell()
+            out.write((
+                f"{image_id} 0 obj\n"
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                f"/ColorSpace {JPEG_COLORSPACES[components]} /BitsPerComponent 8 "
+                f"/Filter /DCTDecode /Length {os.path.getsize(img_path)} >>\nstream\n"
+            ).encode())
+            with open(img_path, 'rb') as f:
+                shutil.copyfileobj(f, out, DOWNLOAD_CHUNK_SIZE)
+            out.write(b"\nendstream\nendobj\n")
+
+            content = f"q {width_pt:.4f} 0 0 {height_pt:.4f} 0 0 cm /Im0 Do Q".encode()
+            write_object(content_id, f"<< /Length {len(content)} >>".encode(), content)
+            write_object(page_id, (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.4f} {height_pt:.4f}] "
+                f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+            ).encode())
+
+        xref_offset = out.tell()
+        size = len(offsets) + 1
+        out.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        out.write(''.join(f"{offsets[obj_id]:010d} 00000 n \n" for obj_id in range(1, size)).encode())
+        out.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+    return True
+
+def init_pdf_worker(log_file, level):
+    """Send PDF worker process logs to the run's log file."""
+    # Forked workers inherit the parent's QueueHandler, whose queue nothing drains here.
+    # No console handler: a plain stream would print through the progress bars, and the
+    # parent already reports each failed PDF on the console
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root_logger.addHandler(file_handler)
+    root_logger.setLevel(level)
 
+def create_pdf_sync(image_paths, output_path):
+    """Synchronous PDF creation wrapper with detailed diagnostics.
+
+    image_paths must already have passed validation in async_download_image.
+    """
     try:
-        with open(output_path, "wb") as f:
-            f.write(img2pdf.convert(valid_images))
+        # JPEG pages are embedded directly; anything else goes through img2pdf
+        if not jpegs_to_pdf(image_paths, output_path):
+            with open(output_path, "wb") as f:
+                img2pdf.convert(image_paths, outputstream=f)
         
         if os.path.getsize(output_path) < 1024:
             raise RuntimeError("PDF file too small, likely invalid")
@@ -330,39 +698,56 @@ async def create_pdf_sync(image_paths, output_path):
         os.remove(output_path)
     return False
 
-async def download_and_create_pdf(session, output_dir, manga_title, chapter_slot, chapter_title, image_urls, keep_images):
+async def download_and_create_pdf(session, pdf_pool, image_pbar, output_dir, temp_root, manga_title, chapter_slot, chapter_title, image_urls, keep_images):
     """Robust PDF creation with enhanced diagnostics."""
-    sanitized_manga_title = sanitize_filename(manga_title)
-    sanitized_chapter_title = sanitize_filename(chapter_title)
-    pdf_filename = f"Chapter_{chapter_slot}_{sanitized_manga_title}_{sanitized_chapter_title}.pdf"
+    pdf_filename = get_pdf_filename(manga_title, chapter_slot, chapter_title)
     pdf_path = os.path.abspath(os.path.join(output_dir, pdf_filename))
     
     if os.path.exists(pdf_path):
         os.remove(pdf_path)
 
-    temp_dir = os.path.abspath(os.path.join(output_dir, f"temp_{chapter_slot}"))
+    temp_dir = os.path.abspath(os.path.join(temp_root, f"temp_{chapter_slot}"))
     os.makedirs(temp_dir, exist_ok=True)
 
     try:
+        # One slot per page, filled as downloads complete, keeps page order without sorting
+        pages = [None] * len(image_urls)
+        downloads = [
+            async_download_image(session, url, temp_dir, idx)
+            for idx, url in enumerate(image_urls, 1)
+        ]
+        # A few chapters download at a time so each one finishes and reaches the PDF
+        # pool early; within a chapter, image_semaphore bounds the concurrent downloads
+        async with chapter_download_semaphore:
+            for download in asyncio.as_completed(downloads):
+                idx, file_path, digest = await download
+                image_pbar.update(1)
+                if file_path:
+                    pages[idx - 1] = (file_path, digest)
+
+        # The same image re-served with a different query string or fragment only needs
+        # its first page. Identical bytes under a different path (e.g. blank spacer
+        # strips in webtoon chapters) are real pages and are kept
+        seen_pages = set()
         valid_files = []
-        with tqdm.tqdm(
-            total=len(image_urls),
-            desc=f"🖼️ Ch-{chapter_slot}",
-            leave=False,
-            unit="img",
-            bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]"
-        ) as pbar:
-            for idx, url in enumerate(image_urls, 1):
-                file_path = await async_download_image(session, url, temp_dir, idx)
-                if file_path and await verify_image_integrity(file_path):
-                    valid_files.append(file_path)
-                pbar.update(1)
+        for url, page in zip(image_urls, pages):
+            if not page:
+                continue
+            key = (url.split('#')[0].split('?')[0], page[1])
+            if key not in seen_pages:
+                seen_pages.add(key)
+                valid_files.append(page[0])
+        duplicates = sum(1 for page in pages if page) - len(valid_files)
+        if duplicates:
+            logging.info(f"Dropped {duplicates} duplicate images from chapter {chapter_slot}")
 
         if not valid_files:
             logging.error("No valid images available for PDF creation")
             return
 
-        success = await create_pdf_sync(valid_files, pdf_path)
+        # PDF assembly is CPU-bound; run it in a worker process off the event loop
+        loop = asyncio.get_running_loop()
+        success = await loop.run_in_executor(pdf_pool, create_pdf_sync, valid_files, pdf_path)
         
         if success:
             logging.info(f"Successfully created PDF: {pdf_path}")
@@ -374,19 +759,23 @@ async def download_and_create_pdf(session, output_dir, manga_title, chapter_slot
         logging.error(f"Critical error in PDF creation: {str(e)}")
     finally:
         if not keep_images:
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            # Deleting hundreds of pages is a burst of unlink calls; keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: shutil.rmtree(temp_dir, ignore_errors=True)
+            )
 
 def generate_html_index(manga_title, chapters, output_dir):
     """Generate an HTML index file with sorted PDF links."""
     html_path = os.path.join(output_dir, "index.html")
-    chapters_sorted = sorted(chapters, key=lambda x: x['slot'])
-    
-    html_content = f"""<!DOCTYPE html>
+    chapters_sorted = sorted(chapters, key=lambda x: x.slot)
+    escaped_title = html.escape(manga_title)
+
+    header = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{manga_title} - PDF Index</title>
+    <title>{escaped_title} - PDF Index</title>
     <style>
         body {{
             font-family: Arial, sans-serif;
@@ -431,23 +820,22 @@ def generate_html_index(manga_title, chapters, output_dir):
     </style>
 </head>
 <body>
-    <h1>{manga_title} - Chapters</h1>
+    <h1>{escaped_title} - Chapters</h1>
     <ol class="chapter-list">
 """
 
-    for chapter in chapters_sorted:
-        sanitized_manga_title = sanitize_filename(manga_title)
-        sanitized_chapter_title = sanitize_filename(chapter['title'])
-        pdf_filename = f"Chapter_{chapter['slot']}_{sanitized_manga_title}_{sanitized_chapter_title}.pdf"
-        html_content += f"""
+    items = [
+        f"""
         <li class="chapter-item">
-            <a href="{pdf_filename}" class="chapter-link">
-                Chapter {chapter['slot']}: {chapter['title']}
+            <a href="{html.escape(get_pdf_filename(manga_title, chapter.slot, chapter.title))}" class="chapter-link">
+                Chapter {html.escape(chapter.slot)}: {html.escape(chapter.title)}
             </a>
         </li>
         """
+        for chapter in chapters_sorted
+    ]
 
-    html_content += f"""
+    footer = f"""
     </ol>
     <div class="help-text">
         <p>Total chapters: {len(chapters_sorted)}</p>
@@ -459,7 +847,7 @@ def generate_html_index(manga_title, chapters, output_dir):
 """
 
     with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+        f.write(''.join([header, *items, footer]))
     logging.info(f"Generated index page: {html_path}")
 
 async def main():
@@ -483,7 +871,14 @@ async def main():
     console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
     root_logger.addHandler(console_handler)
 
-    async with aiohttp.ClientSession(headers=HEADERS) as session:
+    log_listener = None
+    async with aiohttp.ClientSession(
+        headers=HEADERS,
+        connector=create_connector(),
+        timeout=REQUEST_TIMEOUT,
+        # Let the stream buffer fill a whole chunk so each read() returns up to DOWNLOAD_CHUNK_SIZE
+        read_bufsize=DOWNLOAD_CHUNK_SIZE
+    ) as session:
         try:
             title, chapters = await get_content_info(session, args.book_id)
             output_dir = create_output_dir(title, args.book_id)
@@ -492,43 +887,98 @@ async def main():
             log_file = os.path.join(output_dir, 'scraper.log')
             file_handler = logging.FileHandler(log_file, encoding='utf-8')
             file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-            root_logger.addHandler(file_handler)
+
+            # File writes happen on the listener thread so logging never blocks the event loop
+            log_queue = queue.SimpleQueue()
+            log_listener = QueueListener(log_queue, file_handler)
+            log_listener.start()
+            root_logger.addHandler(QueueHandler(log_queue))
             logging.info(f"Logging to file: {log_file}")
 
+            cache_dir = os.path.join(output_dir, '.cache')
+            os.makedirs(cache_dir, exist_ok=True)
+
+            # Skip finished chapters before any of their pages are fetched
+            pending = [
+                ch for ch in chapters
+                if args.force or not os.path.exists(
+                    os.path.join(output_dir, get_pdf_filename(title, ch.slot, ch.title)))
+            ]
+            if len(pending) < len(chapters):
+                logging.info(f"Skipping {len(chapters) - len(pending)} chapters with existing PDFs (use --force to rebuild)")
+
             # Main processing with tqdm integration
-            with logging_redirect_tqdm():
-                # Content URL fetching
-                tasks = [process_chapter(session, args.book_id, ch['slot'], ch['title']) for ch in chapters]
-                all_images = await tqdm.asyncio.tqdm.gather(
-                    *tasks,
+            with logging_redirect_tqdm(), \
+                    ProcessPoolExecutor(
+                        max_workers=PDF_PROCESSOR_WORKERS,
+                        initializer=init_pdf_worker,
+                        initargs=(log_file, root_logger.level)) as pdf_pool, \
+                    tempfile.TemporaryDirectory(prefix='twmanga_') as scratch_dir:
+                # Kept images go next to the PDFs; otherwise stage them in one run-wide
+                # temp dir (often tmpfs) that is removed even if the run is interrupted
+                temp_root = output_dir if args.keep_images else scratch_dir
+
+                url_pbar = tqdm.tqdm(
+                    total=len(pending),
                     desc="📖 Fetching chapter URLs",
                     colour="green",
                     ascii=True  # Better for some terminals
                 )
+                # One aggregate image bar, grown as each chapter's URLs are discovered
+                image_pbar = tqdm.tqdm(
+                    total=0,
+                    desc="🖼️ Downloading images",
+                    unit="img",
+                    disable=args.debug
+                )
+                pdf_pbar = tqdm.tqdm(
+                    total=len(pending),
+                    desc="📚 Creating PDFs",
+                    colour="blue",
+                    disable=args.debug or not pending
+                )
+                warmed_hosts = {}
 
-                # PDF creation phase
-                pdf_tasks = []
-                for chapter, image_urls in zip(chapters, all_images):
+                async def run_chapter(chapter):
+                    # A chapter goes straight from URL discovery to download and PDF,
+                    # so images flow while later chapters are still being walked
+                    image_urls = await process_chapter(session, args.book_id, chapter.slot, chapter.title, cache_dir)
+                    url_pbar.update(1)
                     if not image_urls:
-                        continue
-                    pdf_tasks.append(
-                        download_and_create_pdf(
-                            session, output_dir, title,
-                            chapter['slot'], chapter['title'],
-                            image_urls, args.keep_images
+                        pdf_pbar.total -= 1
+                        pdf_pbar.refresh()
+                        return
+
+                    image_pbar.total += len(image_urls)
+                    image_pbar.refresh()
+
+                    # One warm-up per image host, shared by every chapter that downloads from it,
+                    # so no chapter's burst starts before DNS and TLS are ready
+                    host = urlparse(image_urls[0]).netloc
+                    warm = warmed_hosts.get(host)
+                    if warm is None:
+                        warm = warmed_hosts[host] = asyncio.ensure_future(
+                            prewarm_connection(session, image_urls[0])
                         )
+                    await warm
+
+                    await download_and_create_pdf(
+                        session, pdf_pool, image_pbar, output_dir, temp_root, title,
+                        chapter.slot, chapter.title,
+                        image_urls, args.keep_images
                     )
+                    pdf_pbar.update(1)
 
-                # Use standard tqdm for non-async progress
-                with tqdm.tqdm(
-                    total=len(pdf_tasks),
-                    desc="📚 Creating PDFs",
-                    colour="blue",
-                    disable=args.debug or not pdf_tasks
-                ) as pbar:
-                    for coro in asyncio.as_completed(pdf_tasks):
-                        await coro
-                        pbar.update(1)
+                with url_pbar, image_pbar, pdf_pbar:
+                    # One chapter's failure must not cancel the others mid-download
+                    results = await asyncio.gather(
+                        *(run_chapter(chapter) for chapter in pending),
+                        return_exceptions=True
+                    )
+
+                for chapter, result in zip(pending, results):
+                    if isinstance(result, Exception):
+                        logging.error(f"Chapter {chapter.slot} - {chapter.title} failed: {result!r}")
 
             # Generate index after completion
             generate_html_index(title, chapters, output_dir)
@@ -537,7 +987,15 @@ async def main():
         except Exception as e:
             logging.error(f"Fatal error: {e}")
             raise
-            
+        finally:
+            if log_listener:
+                log_listener.stop()
+
 
 if __name__ == '__main__':
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())  # uvloop is optional (and unavailable on Windows)
+    else:
+        uvloop.run(main())
\ No newline at end of file
@@ -9,12 +9,12 @@ with sync_playwright() as p:
     page = browser.new_page()
     page.goto(f"https://www.8comic.com/html/{book_id}.html")
     header = page.inner_html('head')
-    soup = BeautifulSoup(header, 'html.parser')
+    soup = BeautifulSoup(header, 'lxml')
     meta_name = soup.find('meta', {'name': 'name'})
     book_name = meta_name['content'].strip() if meta_name else "Unknown Comic"
     book_dir = f"{book_name}_{book_id}"
     content_page = page.inner_html('div#chapters')
-    soup = BeautifulSoup(content_page, 'html.parser')
+    soup = BeautifulSoup(content_page, 'lxml')
     chapters = []
     for a_tag in soup.find_all('a'):
         if a_tag.has_attr('id'):
@@ -29,7 +29,7 @@ with sync_playwright() as p:
         page.click(f'a#{chapter}')
         page.is_visible('div.comics-end')
         comic_page = page.inner_html('div#comics-pics')
-        comic_soup = BeautifulSoup(comic_page, 'html.parser')
+        comic_soup = BeautifulSoup(comic_page, 'lxml')
         print('soup ', comic_soup, flush=True)
         images = []
         for img_tag in comic_soup.find_all('img'):